@@ -13,8 +13,11 @@ from telegram.ext import (
     filters,
     ContextTypes,
 )
-from database import db
-from utils import check_whitelist, calculate_score
+from database import db, CompetitionFrozenError
+from utils import check_whitelist, score_submission
+from notifications import notifier
+from lifecycle import lifecycle
+from stats import stats
 
 # States for ConversationHandler
 AUTH_NAME = 1
@@ -28,6 +31,10 @@ MSG_UPLOAD_INSTRUCTION = "لطفا فایل CSV خود را آپلود کنید.
 MSG_PROCESSING = "در حال بررسی فایل... ⏳"
 MSG_ONLY_CSV = "لطفا فقط فایل CSV ارسال کنید."
 MSG_ADMIN_ONLY = "شما دسترسی ادمین ندارید."
+MSG_SHUTTING_DOWN = "ربات در حال راه‌اندازی مجدد است. لطفا چند لحظه دیگر فایل خود را دوباره ارسال کنید."
+MSG_DEFERRED = "ربات در حال راه‌اندازی مجدد است. فایل شما ذخیره شد و پس از راه‌اندازی بررسی می‌شود. ⏳"
+MSG_FROZEN = "❌ مسابقه در حال حاضر بسته است و ارسال جدید پذیرفته نمی‌شود."
+MSG_RESUMED = "در حال بررسی فایل ارسالی قبلی شما ({file_name})... ⏳"
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -90,43 +97,98 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     file_name = document.file_name
     
     if not file_name.lower().endswith('.csv'):
+        stats.record_upload("rejected")
         await update.message.reply_text(MSG_ONLY_CSV)
         return
 
     # Check competition freeze (if implemented). For now skip.
 
+    if not lifecycle.accepting:
+        await update.message.reply_text(MSG_SHUTTING_DOWN)
+        return
+
     status_msg = await update.message.reply_text(MSG_PROCESSING)
-    
+
+    # Scoring runs as a tracked background task so shutdown can drain or persist it
+    job = {
+        "user_id": user_id,
+        "chat_id": update.effective_chat.id,
+        "file_id": document.file_id,
+        "file_name": file_name,
+    }
+    if not lifecycle.submit(job, status_msg):
+        await status_msg.edit_text(MSG_SHUTTING_DOWN)
+
+async def send_result(status_msg, user_id: int, score: float, new_best: float):
+    stats.record_upload("ok")
+    notifier.submission_added()
+    rank = await db.get_user_rank(user_id)
+
+    response = (
+        f"✅ فایل دریافت شد!\n\n"
+        f"📉 خطای RMSE شما: {score:.5f}\n"
+        f"🏆 بهترین رکورد شما: {new_best:.5f}\n"
+        f"📊 رتبه فعلی شما: {rank}"
+    )
+    await status_msg.edit_text(response)
+
+async def process_submission(bot, job: dict, status_msg=None):
+    """Download, score and record one submission. Also used to resume persisted jobs."""
+    user_id = job["user_id"]
+    file_name = job["file_name"]
+
     try:
+        if status_msg is None:
+            status_msg = await bot.send_message(chat_id=job["chat_id"], text=MSG_RESUMED.format(file_name=file_name))
+        # Lets `report_interrupted` answer on the same message if shutdown cancels us
+        job["status_msg"] = status_msg
+
         # Download file
-        file_obj = await document.get_file()
+        file_obj = await bot.get_file(job["file_id"])
         file_bytes = await file_obj.download_as_bytearray()
         
-        # Calculate RMSE
-        # We need the solution file path. 
-        # Requirement says: "store this in the repo root"
-        solution_path = os.path.join(os.getcwd(), 'solution.csv')
-        
-        score, error = calculate_score(file_bytes, solution_path)
+        # Calculate RMSE; internal failures raise ScoringInternalError and count as system errors
+        score, error = await score_submission(file_bytes)
         
         if error:
+            stats.record_upload("rejected")
             await status_msg.edit_text(f"❌ خطا در ارزیابی:\n{error}")
             return
             
         # Success, save to DB
-        new_best = await db.add_submission(user_id, score, file_name)
-        rank = await db.get_user_rank(user_id)
-        
-        response = (
-            f"✅ فایل دریافت شد!\n\n"
-            f"📉 خطای RMSE شما: {score:.5f}\n"
-            f"🏆 بهترین رکورد شما: {new_best:.5f}\n"
-            f"📊 رتبه فعلی شما: {rank}"
-        )
-        await status_msg.edit_text(response)
-        
+        new_best = await lifecycle.record_submission(job, score)
+        await send_result(status_msg, user_id, score, new_best)
+
+    except CompetitionFrozenError:
+        # An admin decision, not a system failure
+        stats.record_upload("rejected")
+        await status_msg.edit_text(MSG_FROZEN)
+
     except Exception as e:
-        await status_msg.edit_text(f"خطای سیستمی: {str(e)}")
+        stats.record_upload("error")
+        if status_msg is not None:
+            await status_msg.edit_text(f"خطای سیستمی: {str(e)}")
+        else:
+            logging.error(f"Failed to process submission of {user_id}: {e}")
+
+async def report_interrupted(bot, job: dict, persisted: bool):
+    """
+    Tell the user what happened to a job cancelled by the shutdown drain.
+    Called by the lifecycle manager once it knows whether the score was
+    recorded and whether the job was saved for resuming.
+    """
+    status_msg = job.get("status_msg")
+    try:
+        if status_msg is None:
+            status_msg = await bot.send_message(chat_id=job["chat_id"], text=MSG_PROCESSING)
+        if job.get("saved"):
+            await send_result(status_msg, job["user_id"], job["score"], job["best"])
+        elif persisted:
+            await status_msg.edit_text(MSG_DEFERRED)
+        else:
+            await status_msg.edit_text(MSG_SHUTTING_DOWN)
+    except Exception as e:
+        logging.error(f"Failed to report interrupted submission of {job['user_id']}: {e}")
 
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     top_users = await db.get_leaderboard(limit=10)
@@ -185,7 +247,8 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [InlineKeyboardButton("اضافه کردن کاربر", callback_data='admin_add_user'),
          InlineKeyboardButton("حذف کاربر", callback_data='admin_remove_user')],
-        [InlineKeyboardButton("خروجی اکسل (CSV)", callback_data='admin_export')],
+        [InlineKeyboardButton("خروجی اکسل (CSV)", callback_data='admin_export'),
+         InlineKeyboardButton("آمار سیستم", callback_data='admin_stats')],
         [InlineKeyboardButton(freeze_text, callback_data=freeze_data)],
         [InlineKeyboardButton("ارسال پیام همگانی", callback_data='admin_broadcast')],
     ]
@@ -201,6 +264,13 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     data = query.data
+
+    # Callback data comes from the client; hiding the buttons is not access control
+    user = await db.get_user(query.from_user.id)
+    if not user or not user.is_admin:
+        await query.answer(MSG_ADMIN_ONLY, show_alert=True)
+        return ConversationHandler.END
+
     await query.answer()
 
     if data == 'admin_export':
@@ -242,6 +312,22 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception as e:
             await status_msg.edit_text(f"خطا در ایجاد خروجی: {e}")
 
+    elif data == 'admin_stats':
+        # Rendered from in-memory counters only, so it costs the same at any table size
+        text = (
+            "📈 آمار سیستم\n\n"
+            f"👥 کاربران ثبت‌نام‌شده: {int(stats.get('users_total'))}\n"
+            f"🧑‍💻 کاربران فعال (حداقل یک ارسال): {int(stats.get('users_active'))}\n"
+            f"📤 کل ارسال‌های ثبت‌شده: {int(stats.get('submissions_total'))}\n"
+            f"⛔️ نرخ رد فایل: {stats.rate('uploads_rejected'):.1%}\n"
+            f"⚠️ نرخ خطای سیستمی: {stats.rate('uploads_error'):.1%}\n\n"
+            "🕒 ارسال در هر ساعت (UTC):\n"
+        )
+        text += "".join(f"{hour}: {count}\n" for hour, count in stats.submissions_per_hour())
+        text += "\n📊 توزیع RMSE:\n"
+        text += "".join(f"{label}: {count}\n" for label, count in stats.histogram())
+        await query.message.reply_text(text)
+
     elif data in ['admin_freeze', 'admin_unfreeze']:
         new_value = "true" if data == 'admin_freeze' else "false"
         await db.set_config("competition_frozen", new_value)
@@ -264,6 +350,9 @@ async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --- Admin Conversation Handlers ---
 
+async def flush_stats_job(context: ContextTypes.DEFAULT_TYPE):
+    await db.flush_stats()
+
 async def admin_broadcast_msg(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     users = await db.get_all_users()
@@ -359,3 +448,7 @@ def setup_handlers(application: Application):
     
     # The /admin command just shows the menu. The menu clicks trigger the conversation.
     application.add_handler(CommandHandler("admin", admin_panel))
+
+    # Persist the admin statistics counters periodically
+    flush_interval = float(os.getenv("STATS_FLUSH_SECONDS", "60"))
+    application.job_queue.run_repeating(flush_stats_job, interval=flush_interval, first=flush_interval)
@@ -1,14 +1,22 @@
 import os
 import asyncio
-from datetime import datetime
+import logging
+import contextlib
+from datetime import datetime, timedelta
 from typing import List, Optional
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, BigInteger, select
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, BigInteger, select, func, event, delete, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import declarative_base, relationship
 
+from stats import stats, hour_key, histogram_bin, HOURS_KEPT
+
 Base = declarative_base()
 
+class CompetitionFrozenError(Exception):
+    """Raised by `Database.add_submission` while an admin has frozen the competition."""
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -42,6 +50,23 @@ class AllowedUser(Base):
     full_name = Column(String, primary_key=True)
     added_at = Column(DateTime, default=datetime.utcnow)
 
+class PendingSubmission(Base):
+    """An upload that was still being scored at shutdown; resumed on the next start."""
+    __tablename__ = 'pending_submissions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    file_id = Column(String, nullable=False)
+    file_name = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Aggregate(Base):
+    """Periodic snapshot of the in-memory counters in stats.py."""
+    __tablename__ = 'aggregates'
+    key = Column(String, primary_key=True)
+    value = Column(Float, nullable=False, default=0)
+
 class Database:
     def __init__(self):
         self.db_url = os.getenv("DATABASE_URL")
@@ -51,16 +76,68 @@ class Database:
         # Ensure using asyncpg driver
         if self.db_url.startswith("postgresql://"):
              self.db_url = self.db_url.replace("postgresql://", "postgresql+asyncpg://")
-             
-        self.engine = create_async_engine(self.db_url, echo=False)
+        # Embedded mode for single-node deployments and offline testing
+        elif self.db_url.startswith("sqlite://"):
+             self.db_url = self.db_url.replace("sqlite://", "sqlite+aiosqlite://")
+
+        self.is_sqlite = self.db_url.startswith("sqlite")
+        self.single_connection = False
+        if self.is_sqlite:
+            self.engine = self._create_sqlite_engine()
+        else:
+            self.engine = create_async_engine(self.db_url, echo=False)
         self.SessionLocal = async_sessionmaker(self.engine, expire_on_commit=False, class_=AsyncSession)
+        self._write_lock = None
+
+    def _create_sqlite_engine(self):
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" in self.db_url or self.db_url.endswith("://"):
+            # Every connection would otherwise get its own empty in-memory database
+            kwargs["poolclass"] = StaticPool
+            self.single_connection = True
+        engine = create_async_engine(self.db_url, echo=False, **kwargs)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_conn, connection_record):
+            cursor = dbapi_conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA cache_size=-20000")
+            cursor.close()
+
+        return engine
+
+    def _writer(self):
+        """
+        Serializes writes on SQLite, which only allows a single writer at a time.
+        Queuing them here avoids SQLITE_BUSY errors; Postgres needs no such guard.
+        """
+        if not self.is_sqlite:
+            return contextlib.nullcontext()
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        return self._write_lock
+
+    def _reader(self):
+        """
+        Serializes reads too when every session shares one connection (in-memory
+        SQLite): a read session closing mid-write would roll back that write.
+        """
+        if not self.single_connection:
+            return contextlib.nullcontext()
+        return self._writer()
 
     async def init_db(self):
-        async with self.engine.begin() as conn:
+        # A fresh lock per run, since run_bot may restart on a new event loop
+        self._write_lock = None
+        async with self._writer(), self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
             
         # Seed initial whitelist if empty
-        async with self.SessionLocal() as session:
+        async with self._writer(), self.SessionLocal() as session:
             initial_list = [
                     "محمد هادی گلی بیدگلی", "شایان گنجی", "سهیل نوحی", "مرضیه معتمدنیا", "پارمیدا هدایتی","نگین مهرپرور","معصومه ندرلی","ایلیا هراتی","محمد مهدی ترک تتاری","مهدیه مقیسه","یسنا جعفری","مهشید فعلی","امین صفری","فرزاد شهبازی","ایمان ارباب","باربد قنبری","سبحان ابراهیمی",
                 ]
@@ -83,27 +160,40 @@ class Database:
                 session.add_all(users_to_add)
                 await session.commit()
                 print(f"Added {len(users_to_add)} missing users.")    
+
+    async def prewarm(self, connections: int = 5):
+        """Open pool connections up front so the first requests don't pay for it."""
+        size = getattr(self.engine.pool, "size", lambda: 1)()
+
+        async def ping():
+            async with self._reader(), self.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        # Held concurrently, so each ping checks out a distinct connection
+        await asyncio.gather(*(ping() for _ in range(max(1, min(connections, size)))))
+
     async def get_session(self) -> AsyncSession:
         return self.SessionLocal()
         
     async def get_user(self, telegram_id: int) -> Optional[User]:
-        async with self.SessionLocal() as session:
+        async with self._reader(), self.SessionLocal() as session:
             result = await session.execute(select(User).where(User.telegram_id == telegram_id))
             return result.scalars().first()
 
     async def create_user(self, telegram_id: int, full_name: str, is_admin: bool = False):
-        async with self.SessionLocal() as session:
+        async with self._writer(), self.SessionLocal() as session:
             new_user = User(telegram_id=telegram_id, full_name=full_name, is_admin=is_admin)
             session.add(new_user)
             await session.commit()
+            stats.record_user_created()
             return new_user
 
     async def add_submission(self, telegram_id: int, rmse: float, file_name: str):
-        async with self.SessionLocal() as session:
+        async with self._writer(), self.SessionLocal() as session:
             # Check for freeze
             config = await session.get(Config, "competition_frozen")
             if config and config.value == "true":
-                 raise Exception("Competition is currently frozen.")
+                 raise CompetitionFrozenError("Competition is currently frozen.")
 
             # Add submission
             new_sub = Submission(user_id=telegram_id, rmse=rmse, file_name=file_name)
@@ -117,35 +207,115 @@ class Database:
                     user.best_rmse = rmse
             
             await session.commit()
+            stats.record_submission(rmse, first_submission=user is not None and user.submission_count == 1)
             return user.best_rmse
 
     async def get_leaderboard(self, limit: int = 10):
-        async with self.SessionLocal() as session:
+        async with self._reader(), self.SessionLocal() as session:
             result = await session.execute(
                 select(User)
                 .where(User.best_rmse != float('inf'))
-                .order_by(User.best_rmse.asc())
+                .order_by(User.best_rmse.asc(), User.telegram_id.asc())
                 .limit(limit)
             )
             return result.scalars().all()
             
+    async def get_top_ranked(self, n: int = 10):
+        """Users ranked n or better; more than n when several tie at the cutoff."""
+        async with self._reader(), self.SessionLocal() as session:
+            ranked = select(User).where(User.best_rmse != float('inf'))
+            cutoff = (await session.execute(
+                select(User.best_rmse)
+                .where(User.best_rmse != float('inf'))
+                .order_by(User.best_rmse.asc())
+                .offset(n - 1)
+                .limit(1)
+            )).scalar()
+            if cutoff is not None:
+                ranked = ranked.where(User.best_rmse <= cutoff)
+            result = await session.execute(ranked.order_by(User.best_rmse.asc(), User.telegram_id.asc()))
+            return result.scalars().all()
+
     async def get_user_rank(self, telegram_id: int):
-        async with self.SessionLocal() as session:
+        async with self._reader(), self.SessionLocal() as session:
             user = await session.get(User, telegram_id)
             if not user or user.best_rmse == float('inf'):
                 return None
-            query = select(User).where(User.best_rmse < user.best_rmse)
+            query = select(func.count()).select_from(User).where(User.best_rmse < user.best_rmse)
             result = await session.execute(query)
-            return len(result.scalars().all()) + 1
+            return result.scalar_one() + 1
             
     async def get_all_users(self):
-        async with self.SessionLocal() as session:
+        async with self._reader(), self.SessionLocal() as session:
             result = await session.execute(select(User))
             return result.scalars().all()
 
+    # --- Pending Submission Methods ---
+    async def add_pending_submissions(self, jobs: List[dict]):
+        async with self._writer(), self.SessionLocal() as session:
+            session.add_all([PendingSubmission(**job) for job in jobs])
+            await session.commit()
+
+    async def pop_pending_submissions(self) -> List[dict]:
+        async with self._writer(), self.SessionLocal() as session:
+            result = await session.execute(select(PendingSubmission).order_by(PendingSubmission.id))
+            pending = result.scalars().all()
+            if pending:
+                await session.execute(delete(PendingSubmission).where(PendingSubmission.id.in_([p.id for p in pending])))
+                await session.commit()
+            return [
+                {"user_id": p.user_id, "chat_id": p.chat_id, "file_id": p.file_id, "file_name": p.file_name}
+                for p in pending
+            ]
+
+    # --- Statistics Methods ---
+    async def load_stats(self):
+        """Load the counters from `aggregates`, backfilling them once if the table is new."""
+        async with self._reader(), self.SessionLocal() as session:
+            result = await session.execute(select(Aggregate))
+            values = {a.key: a.value for a in result.scalars().all()}
+        if values:
+            stats.load(values)
+            return
+
+        # One-off full scan; from here on the counters are maintained incrementally
+        async with self._reader(), self.SessionLocal() as session:
+            values["users_total"] = (await session.execute(select(func.count()).select_from(User))).scalar_one()
+            values["users_active"] = (await session.execute(
+                select(func.count()).select_from(User).where(User.submission_count > 0)
+            )).scalar_one()
+            values["submissions_total"] = (await session.execute(select(func.count()).select_from(Submission))).scalar_one()
+            for rmse in (await session.execute(select(Submission.rmse))).scalars():
+                key = f"hist:{histogram_bin(rmse)}"
+                values[key] = values.get(key, 0) + 1
+            since = datetime.utcnow() - timedelta(hours=HOURS_KEPT)
+            for ts in (await session.execute(select(Submission.timestamp).where(Submission.timestamp >= since))).scalars():
+                values[hour_key(ts)] = values.get(hour_key(ts), 0) + 1
+        stats.load(values)
+        await self.save_aggregates(values, [])
+
+    async def save_aggregates(self, changed: dict, expired: List[str]):
+        async with self._writer(), self.SessionLocal() as session:
+            for key, value in changed.items():
+                await session.merge(Aggregate(key=key, value=value))
+            if expired:
+                await session.execute(delete(Aggregate).where(Aggregate.key.in_(expired)))
+            await session.commit()
+
+    async def flush_stats(self):
+        """Write counters changed since the last flush to `aggregates`."""
+        changed, expired = stats.collect_changes()
+        if not changed and not expired:
+            return
+        try:
+            await self.save_aggregates(changed, expired)
+        except Exception as e:
+            stats.mark_dirty(changed, expired)
+            logging.error(f"Failed to flush statistics: {e}")
+
     # --- Admin Config Methods ---
     async def set_config(self, key: str, value: str):
-        async with self.SessionLocal() as session:
+        async with self._writer(), self.SessionLocal() as session:
             conf = await session.get(Config, key)
             if not conf:
                 conf = Config(key=key, value=value)
@@ -155,24 +325,24 @@ class Database:
             await session.commit()
             
     async def get_config(self, key: str) -> Optional[str]:
-        async with self.SessionLocal() as session:
+        async with self._reader(), self.SessionLocal() as session:
             conf = await session.get(Config, key)
             return conf.value if conf else None
 
     # --- Whitelist Methods ---
     async def is_whitelisted(self, full_name: str) -> bool:
-        async with self.SessionLocal() as session:
+        async with self._reader(), self.SessionLocal() as session:
             user = await session.get(AllowedUser, full_name)
             return user is not None
             
     async def add_allowed_user(self, full_name: str):
-        async with self.SessionLocal() as session:
+        async with self._writer(), self.SessionLocal() as session:
             if not await session.get(AllowedUser, full_name):
                 session.add(AllowedUser(full_name=full_name))
                 await session.commit()
 
     async def remove_allowed_user(self, full_name: str):
-        async with self.SessionLocal() as session:
+        async with self._writer(), self.SessionLocal() as session:
             user = await session.get(AllowedUser, full_name)
             if user:
                 await session.delete(user)
@@ -0,0 +1,124 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from database import db
+from notifications import notifier
+from utils import warm_up_scoring
+
+
+class LifecycleManager:
+    """
+    Owns startup warm-up and graceful shutdown of submission scoring.
+
+    Uploads are scored in tasks tracked here rather than inside the update
+    handler, so that shutdown can stop accepting new ones, give the ones in
+    flight `SHUTDOWN_DRAIN_SECONDS` to finish, and persist whatever is left to
+    the `pending_submissions` table to be resumed on the next start.
+
+    A job is a dict with `user_id`, `chat_id`, `file_id` and `file_name`. The
+    processor records its score through `record_submission`, which finishes the
+    database write even if the job is cancelled and then sets `job["saved"]`,
+    so a job cancelled around that point is not scored twice. Users of cancelled
+    jobs are only told the outcome, through `on_interrupted`, once those writes
+    have settled and it is known which jobs were persisted.
+    """
+
+    def __init__(self):
+        self.drain_timeout = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+        self.pool_connections = int(os.getenv("DB_PREWARM_CONNECTIONS", "5"))
+
+        self.accepting = False
+        self.bot = None
+        self.processor: Optional[Callable[..., Awaitable[None]]] = None
+        self.on_interrupted: Optional[Callable[..., Awaitable[None]]] = None
+        self._jobs: Dict[asyncio.Task, dict] = {}
+        self._writes: Set[asyncio.Task] = set()
+
+    async def start(self, bot, processor: Callable[..., Awaitable[None]], on_interrupted: Callable[..., Awaitable[None]]):
+        """Warm everything up, resume leftovers from the last run, then accept uploads."""
+        self.bot = bot
+        self.processor = processor
+        self.on_interrupted = on_interrupted
+
+        await db.init_db()
+        print("Database initialized successfully.")
+        await db.prewarm(self.pool_connections)
+        await warm_up_scoring()
+        await db.load_stats()
+        await notifier.start(bot)
+        print("Warm-up complete.")
+
+        self.accepting = True
+        pending = await db.pop_pending_submissions()
+        for job in pending:
+            self.submit(job)
+        if pending:
+            print(f"Resumed {len(pending)} unfinished submissions.")
+
+    def submit(self, job: dict, status_msg=None) -> bool:
+        """Score `job` in the background. Returns False if shutting down."""
+        if not self.accepting:
+            return False
+        task = asyncio.create_task(self.processor(self.bot, job, status_msg))
+        self._jobs[task] = job
+        task.add_done_callback(self._jobs.pop)
+        return True
+
+    async def record_submission(self, job: dict, score: float) -> float:
+        """`db.add_submission` for `job`, shielded from drain cancellation."""
+        async def write():
+            new_best = await db.add_submission(job["user_id"], score, job["file_name"])
+            job.update(saved=True, score=score, best=new_best)
+            return new_best
+
+        task = asyncio.create_task(write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        return await asyncio.shield(task)
+
+    async def shutdown(self):
+        """Stop accepting uploads, drain the ones in flight and persist the rest."""
+        was_running = self.bot is not None
+        self.accepting = False
+
+        if self._jobs:
+            print(f"Draining {len(self._jobs)} in-flight submissions...")
+            done, pending = await asyncio.wait(list(self._jobs), timeout=self.drain_timeout)
+            pending_jobs = [self._jobs[task] for task in pending]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            # Shielded writes outlive their cancelled job; only after they settle is `saved` final
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+            unfinished = [
+                {k: job[k] for k in ("user_id", "chat_id", "file_id", "file_name")}
+                for job in pending_jobs
+                if not job.get("saved")
+            ]
+
+            persisted = True
+            if unfinished:
+                try:
+                    await db.add_pending_submissions(unfinished)
+                    print(f"Persisted {len(unfinished)} unfinished submissions.")
+                except Exception as e:
+                    persisted = False
+                    logging.error(f"Failed to persist unfinished submissions: {e}")
+
+            for job in pending_jobs:
+                await self.on_interrupted(self.bot, job, persisted)
+
+        if was_running:
+            await notifier.stop(timeout=self.drain_timeout)
+        # Final write of the statistics counters, including drained submissions
+        await db.flush_stats()
+        self.bot = None
+        # Pooled connections are bound to this event loop; run_bot may start a new one
+        await db.engine.dispose()
+
+
+# Singleton instance
+lifecycle = LifecycleManager()
@@ -6,7 +6,8 @@ import asyncio
 from telegram.ext import Application
 from telegram.request import HTTPXRequest
 from telegram.error import NetworkError
-from bot import setup_handlers
+from bot import setup_handlers, process_submission, report_interrupted
+from lifecycle import lifecycle
 
 
 def main():
@@ -36,9 +37,12 @@ def main():
         request = HTTPXRequest(http_version="1.1", httpx_kwargs=httpx_kwargs)
 
         async def post_init(application: Application):
-            from database import db
-            await db.init_db()
-            print("Database initialized successfully.")
+            # Prewarm the DB pool, scoring workers and caches before polling starts
+            await lifecycle.start(application.bot, process_submission, report_interrupted)
+
+        async def post_stop(application: Application):
+            # The bot is still usable here, so drained submissions can still be answered
+            await lifecycle.shutdown()
 
         app = (
             Application.builder()
@@ -46,6 +50,7 @@ def main():
             .request(request)
             .get_updates_request(request)
             .post_init(post_init)
+            .post_stop(post_stop)
             .build()
         )
         setup_handlers(app)
@@ -62,10 +67,14 @@ def main():
         try:
             app = build_application(trust_env)
             # Prevent PTB from closing the loop so we can tidy up deterministically here.
-            app.run_polling(allowed_updates=["message"], close_loop=False)
+            # callback_query is needed for the inline buttons of the /admin panel
+            app.run_polling(allowed_updates=["message", "callback_query"], close_loop=False)
         finally:
             # Clean shutdown to avoid "Event loop is closed" on subsequent runs.
             if not loop.is_closed():
+                # If the run died before post_stop (e.g. before the proxy fallback),
+                # uploads still in flight are persisted instead of being lost.
+                loop.run_until_complete(lifecycle.shutdown())
                 loop.run_until_complete(loop.shutdown_asyncgens())
                 loop.close()
             asyncio.set_event_loop(None)
@@ -0,0 +1,118 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from database import db
+
+# Messages (Persian)
+MSG_RANK_DROPPED = "⚠️ رتبه شما در جدول امتیازات از {old} به {new} تغییر کرد.\nبرای مشاهده جدول /leaderboard را بزنید."
+MSG_LEFT_TOP = "⚠️ شما از جمع {top_n} نفر برتر جدول امتیازات خارج شدید (رتبه قبلی: {old}).\nبرای مشاهده جدول /leaderboard را بزنید."
+
+
+class LeaderboardNotifier:
+    """
+    Pushes a message to users who lose ground in the top-N of the leaderboard.
+
+    Submissions only mark the leaderboard as dirty; the actual diff against the
+    last known top-N runs once per coalescing window, so a burst of submissions
+    produces at most one message per affected user. Messages are delivered by a
+    single background sender that respects a global rate limit.
+    """
+
+    def __init__(self):
+        self.top_n = int(os.getenv("NOTIFY_TOP_N", "10"))
+        self.window = float(os.getenv("NOTIFY_WINDOW_SECONDS", "30"))
+        self.rate = float(os.getenv("NOTIFY_RATE_PER_SECOND", "20"))
+
+        self.bot = None
+        self._snapshot: Dict[int, int] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._sender_task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self, bot):
+        """Load the current top-N and start the background sender."""
+        self.bot = bot
+        self._snapshot = await self._load_snapshot()
+        # Created here so they bind to the loop that is actually running the bot
+        self._queue = asyncio.Queue()
+        self._sender_task = asyncio.create_task(self._sender())
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Flush a pending window and deliver what is queued within `timeout` seconds."""
+        try:
+            if self._flush_task and not self._flush_task.done():
+                self._flush_task.cancel()
+                await self._flush()
+            self._flush_task = None
+
+            if self._sender_task:
+                try:
+                    await asyncio.wait_for(self._queue.join(), timeout)
+                except asyncio.TimeoutError:
+                    logging.error(f"Dropped {self._queue.qsize()} undelivered notifications on shutdown.")
+        finally:
+            if self._sender_task:
+                self._sender_task.cancel()
+                await asyncio.gather(self._sender_task, return_exceptions=True)
+                self._sender_task = None
+            # No sender is running any more, so stop opening new windows
+            self._queue = None
+
+    def submission_added(self):
+        """Called after `db.add_submission`; opens a coalescing window if none is open."""
+        if self._queue is None:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _load_snapshot(self) -> Dict[int, int]:
+        # Membership is by rank, not list position, so a tie at the cutoff keeps everyone in
+        top_users = await db.get_top_ranked(self.top_n)
+        # Same rank as `db.get_user_rank`: users strictly better + 1, so ties share a rank
+        ranks = {}
+        for i, u in enumerate(top_users, 1):
+            if i > 1 and u.best_rmse == top_users[i - 2].best_rmse:
+                ranks[u.telegram_id] = ranks[top_users[i - 2].telegram_id]
+            else:
+                ranks[u.telegram_id] = i
+        return ranks
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        await self._flush()
+
+    async def _flush(self):
+        try:
+            current = await self._load_snapshot()
+        except Exception as e:
+            logging.error(f"Failed to load leaderboard for notifications: {e}")
+            return
+
+        previous, self._snapshot = self._snapshot, current
+        for telegram_id, old_rank in previous.items():
+            new_rank = current.get(telegram_id)
+            if new_rank is None:
+                text = MSG_LEFT_TOP.format(top_n=self.top_n, old=old_rank)
+            elif new_rank > old_rank:
+                text = MSG_RANK_DROPPED.format(old=old_rank, new=new_rank)
+            else:
+                continue
+            self._queue.put_nowait((telegram_id, text))
+
+    async def _sender(self):
+        interval = 1.0 / self.rate if self.rate > 0 else 0
+        while True:
+            chat_id, text = await self._queue.get()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+            except Exception as e:
+                logging.error(f"Failed to notify {chat_id}: {e}")
+            finally:
+                self._queue.task_done()
+            await asyncio.sleep(interval)
+
+
+# Singleton instance
+notifier = LeaderboardNotifier()
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Upper edges of the RMSE histogram bins; the last bin collects everything above
+HISTOGRAM_EDGES = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100]
+
+# Hourly submission buckets older than this are dropped
+HOURS_KEPT = 48
+
+HOUR_PREFIX = "hour:"
+HIST_PREFIX = "hist:"
+
+
+def hour_key(at: datetime) -> str:
+    return HOUR_PREFIX + at.strftime("%Y-%m-%dT%H")
+
+
+def histogram_bin(rmse: float) -> int:
+    for i, edge in enumerate(HISTOGRAM_EDGES):
+        if rmse <= edge:
+            return i
+    return len(HISTOGRAM_EDGES)
+
+
+class StatsAggregator:
+    """
+    In-memory counters behind the admin statistics panel.
+
+    `Database.create_user`, `Database.add_submission` and the upload handler
+    bump these as events happen, so rendering the panel never touches the
+    `submissions` table. Every key is also a row of the `aggregates` table;
+    changed keys are tracked and written back by `Database.flush_stats`.
+    """
+
+    def __init__(self):
+        self.values: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._expired: Set[str] = set()
+
+    def load(self, values: Dict[str, float]):
+        self.values = dict(values)
+        self._dirty.clear()
+        self._expired.clear()
+
+    def _incr(self, key: str, amount: float = 1):
+        self.values[key] = self.values.get(key, 0) + amount
+        self._dirty.add(key)
+
+    def _prune_hours(self, now: datetime):
+        oldest = hour_key(now - timedelta(hours=HOURS_KEPT))
+        for key in [k for k in self.values if k.startswith(HOUR_PREFIX) and k < oldest]:
+            del self.values[key]
+            self._dirty.discard(key)
+            self._expired.add(key)
+
+    # --- Recording ---
+    def record_user_created(self):
+        self._incr("users_total")
+
+    def record_submission(self, rmse: float, first_submission: bool, at: datetime = None):
+        at = at or datetime.utcnow()
+        self._incr("submissions_total")
+        self._incr(hour_key(at))
+        self._incr(f"{HIST_PREFIX}{histogram_bin(rmse)}")
+        if first_submission:
+            self._incr("users_active")
+        self._prune_hours(at)
+
+    def record_upload(self, outcome: str):
+        """`outcome` is one of "ok", "rejected" (bad file) or "error" (system failure)."""
+        self._incr("uploads_total")
+        if outcome != "ok":
+            self._incr(f"uploads_{outcome}")
+
+    # --- Flushing ---
+    def collect_changes(self) -> Tuple[Dict[str, float], List[str]]:
+        """Changed values and dropped keys since the last call."""
+        changed = {k: self.values[k] for k in self._dirty}
+        expired = list(self._expired)
+        self._dirty.clear()
+        self._expired.clear()
+        return changed, expired
+
+    def mark_dirty(self, keys: Iterable[str], expired: Iterable[str] = ()):
+        """Re-queue keys after a failed flush."""
+        self._dirty.update(k for k in keys if k in self.values)
+        self._expired.update(expired)
+
+    # --- Reading ---
+    def get(self, key: str) -> float:
+        return self.values.get(key, 0)
+
+    def submissions_per_hour(self, hours: int = 12, now: datetime = None) -> List[Tuple[str, int]]:
+        now = now or datetime.utcnow()
+        return [
+            ((now - timedelta(hours=i)).strftime("%H:00"), int(self.get(hour_key(now - timedelta(hours=i)))))
+            for i in range(hours)
+        ]
+
+    def histogram(self) -> List[Tuple[str, int]]:
+        labels = [f"≤ {edge}" for edge in HISTOGRAM_EDGES] + [f"> {HISTOGRAM_EDGES[-1]}"]
+        return [(label, int(self.get(f"{HIST_PREFIX}{i}"))) for i, label in enumerate(labels)]
+
+    def rate(self, key: str) -> float:
+        total = self.get("uploads_total")
+        return self.get(key) / total if total else 0.0
+
+
+# Singleton instance
+stats = StatsAggregator()
@@ -0,0 +1,87 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOLUTION = os.path.join(ROOT, "solution.csv")
+
+# Every test gets a fresh embedded database; nothing here needs Postgres or Telegram
+os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+sys.path.insert(0, ROOT)
+
+from database import db, Database
+from stats import stats
+
+
+class FakeMessage:
+    """A sent Telegram message; `text` follows every `edit_text`."""
+
+    def __init__(self, chat_id=None, text=None):
+        self.chat_id = chat_id
+        self.text = text
+
+    async def edit_text(self, text):
+        self.text = text
+
+
+class FakeFile:
+    def __init__(self, content: bytes, delay: float = 0):
+        self.content = content
+        self.delay = delay
+
+    async def download_as_bytearray(self):
+        await asyncio.sleep(self.delay)
+        return bytearray(self.content)
+
+
+class FakeBot:
+    """
+    Just enough of `telegram.Bot` for the scoring and notification paths.
+    Every uploaded file downloads as `content` (the solution itself by default),
+    and sent messages are kept in `sent` as `(chat_id, text)` pairs.
+    """
+
+    def __init__(self, content: bytes = None, download_delay: float = 0):
+        if content is None:
+            with open(SOLUTION, "rb") as f:
+                content = f.read()
+        self.content = content
+        self.download_delay = download_delay
+        self.sent = []
+
+    async def get_file(self, file_id):
+        return FakeFile(self.content, self.download_delay)
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+        return FakeMessage(chat_id, text)
+
+
+def make_job(user_id=1):
+    return {"user_id": user_id, "chat_id": user_id, "file_id": "file", "file_name": "s.csv"}
+
+
+@pytest.fixture
+def run():
+    """Run coroutines on a private loop against a freshly created in-memory database."""
+    loop = asyncio.new_event_loop()
+    stats.load({})
+    loop.run_until_complete(db.init_db())
+    yield loop.run_until_complete
+    # Closing the only StaticPool connection discards the in-memory database
+    loop.run_until_complete(db.engine.dispose())
+    loop.close()
+
+
+@pytest.fixture
+def file_db(run, tmp_path, monkeypatch):
+    """Back `db` with a SQLite file instead, for tests that span a shutdown and restart."""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'league.db'}")
+    file_backed = Database()
+    monkeypatch.setattr(db, "engine", file_backed.engine)
+    monkeypatch.setattr(db, "SessionLocal", file_backed.SessionLocal)
+    monkeypatch.setattr(db, "single_connection", file_backed.single_connection)
+    run(db.init_db())
+    return db
@@ -0,0 +1,62 @@
+import asyncio
+
+from sqlalchemy import select, func
+
+from database import db, Submission
+
+
+def test_leaderboard_and_rank(run):
+    async def scenario():
+        for uid, name in [(1, "a"), (2, "b"), (3, "c")]:
+            await db.create_user(uid, name)
+        await db.add_submission(1, 0.5, "a.csv")
+        await db.add_submission(2, 0.3, "b.csv")
+        best = await db.add_submission(1, 0.2, "a2.csv")
+        board = await db.get_leaderboard()
+        ranks = [await db.get_user_rank(uid) for uid in (1, 2, 3)]
+        return best, board, ranks
+
+    best, board, ranks = run(scenario())
+    assert best == 0.2
+    assert [u.telegram_id for u in board] == [1, 2]
+    assert ranks == [1, 2, None]
+
+
+def test_ties_share_rank_and_order_is_stable(run):
+    async def scenario():
+        for uid in (3, 1, 2):
+            await db.create_user(uid, f"user {uid}")
+            await db.add_submission(uid, 0.4, "s.csv")
+        board = await db.get_leaderboard()
+        return [u.telegram_id for u in board], [await db.get_user_rank(uid) for uid in (1, 2, 3)]
+
+    order, ranks = run(scenario())
+    assert order == [1, 2, 3]
+    assert ranks == [1, 1, 1]
+
+
+def test_concurrent_writes_are_serialized(run):
+    async def scenario():
+        await db.create_user(1, "a")
+        await asyncio.gather(*(db.add_submission(1, 1.0 / (i + 1), f"{i}.csv") for i in range(20)))
+        return await db.get_user(1)
+
+    user = run(scenario())
+    assert user.submission_count == 20
+    assert user.best_rmse == 1.0 / 20
+
+
+def test_concurrent_reads_do_not_disturb_writes(run):
+    async def scenario():
+        await db.create_user(1, "a")
+        calls = []
+        for i in range(100):
+            calls.append(db.add_submission(1, 1.0 / (i + 1), f"{i}.csv"))
+            calls.append(db.get_leaderboard())
+            calls.append(db.get_user_rank(1))
+        await asyncio.gather(*calls)
+        async with db.SessionLocal() as session:
+            stored = (await session.execute(select(func.count()).select_from(Submission))).scalar_one()
+        return (await db.get_user(1)).submission_count, stored
+
+    assert run(scenario()) == (100, 100)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import utils
+import bot as bot_module
+from database import db
+from lifecycle import lifecycle
+from conftest import SOLUTION, FakeBot, FakeMessage, make_job
+
+
+@pytest.fixture(autouse=True)
+def solution_path(monkeypatch):
+    monkeypatch.setattr(utils, "SOLUTION_PATH", SOLUTION)
+    monkeypatch.setattr(lifecycle, "drain_timeout", 0.05)
+
+
+def test_unfinished_submission_is_persisted_and_resumed(run, file_db):
+    status = FakeMessage()
+
+    async def first_run():
+        await lifecycle.start(FakeBot(download_delay=10), bot_module.process_submission, bot_module.report_interrupted)
+        await db.create_user(1, "a")
+        lifecycle.submit(make_job(), status)
+        await asyncio.sleep(0)
+        await lifecycle.shutdown()
+
+    async def second_run():
+        await lifecycle.start(FakeBot(), bot_module.process_submission, bot_module.report_interrupted)
+        await asyncio.gather(*list(lifecycle._jobs))
+        user = await db.get_user(1)
+        leftovers = await db.pop_pending_submissions()
+        await lifecycle.shutdown()
+        return user, leftovers
+
+    run(first_run())
+    assert status.text == bot_module.MSG_DEFERRED
+    user, leftovers = run(second_run())
+    assert user.submission_count == 1
+    assert user.best_rmse == 0
+    assert leftovers == []
+
+
+def test_cancelled_write_is_not_persisted_twice(run, file_db, monkeypatch):
+    real_add = db.add_submission
+
+    async def slow_add(*args):
+        await asyncio.sleep(0.1)  # outlasts the drain deadline
+        return await real_add(*args)
+
+    monkeypatch.setattr(db, "add_submission", slow_add)
+
+    status = FakeMessage()
+
+    async def scenario():
+        await lifecycle.start(FakeBot(), bot_module.process_submission, bot_module.report_interrupted)
+        await db.create_user(1, "a")
+        lifecycle.submit(make_job(), status)
+        await asyncio.sleep(0.02)
+        await lifecycle.shutdown()
+        return await db.get_user(1), await db.pop_pending_submissions()
+
+    user, pending = run(scenario())
+    assert user.submission_count == 1
+    assert pending == []
+    # The score did land, so the user gets their result rather than "deferred"
+    assert status.text.startswith("✅")
+    assert "📊 رتبه فعلی شما: 1" in status.text
+
+
+def test_missing_solution_does_not_block_startup(run, monkeypatch):
+    monkeypatch.setattr(utils, "SOLUTION_PATH", "/nonexistent/solution.csv")
+
+    async def scenario():
+        await lifecycle.start(FakeBot(), bot_module.process_submission, bot_module.report_interrupted)
+        accepting = lifecycle.accepting
+        await lifecycle.shutdown()
+        return accepting
+
+    assert run(scenario()) is True
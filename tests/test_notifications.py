@@ -0,0 +1,88 @@
+import asyncio
+
+from database import db
+from notifications import notifier
+from conftest import FakeBot
+
+
+async def submit(telegram_id, rmse):
+    await db.add_submission(telegram_id, rmse, "s.csv")
+    notifier.submission_added()
+
+
+def test_burst_is_coalesced_into_one_message_per_user(run, monkeypatch):
+    monkeypatch.setattr(notifier, "window", 0.05)
+    monkeypatch.setattr(notifier, "rate", 1000)
+    bot = FakeBot()
+
+    async def scenario():
+        for uid in (1, 2, 3):
+            await db.create_user(uid, f"user {uid}")
+        await db.add_submission(1, 0.3, "s.csv")
+        await db.add_submission(2, 0.4, "s.csv")
+        await notifier.start(bot)
+
+        # Two overtakes inside one window: user 1 goes 1 -> 3, user 2 goes 2 -> 4
+        await submit(3, 0.2)
+        await submit(3, 0.1)
+        await db.create_user(4, "user 4")
+        await submit(4, 0.15)
+        await asyncio.sleep(0.2)
+        await notifier.stop(timeout=1)
+
+    run(scenario())
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [1, 2]
+    assert "1 به 3" in dict(bot.sent)[1]
+    assert "2 به 4" in dict(bot.sent)[2]
+
+
+def test_tied_scores_do_not_trigger_messages(run, monkeypatch):
+    monkeypatch.setattr(notifier, "window", 0.05)
+    bot = FakeBot()
+
+    async def scenario():
+        for uid in (1, 2, 3):
+            await db.create_user(uid, f"user {uid}")
+        await db.add_submission(2, 0.5, "s.csv")
+        await db.add_submission(3, 0.5, "s.csv")
+        await notifier.start(bot)
+
+        # Joins the tie: nobody is strictly better than before
+        await submit(1, 0.5)
+        await asyncio.sleep(0.2)
+        await notifier.stop(timeout=1)
+
+    run(scenario())
+    assert bot.sent == []
+
+
+def test_no_windows_open_after_stop(run):
+    async def scenario():
+        await notifier.start(FakeBot())
+        await notifier.stop(timeout=1)
+        notifier.submission_added()
+        return notifier._flush_task
+
+    assert run(scenario()) is None
+
+
+def test_tie_at_cutoff_keeps_user_in_top_n(run, monkeypatch):
+    monkeypatch.setattr(notifier, "window", 0.05)
+    monkeypatch.setattr(notifier, "top_n", 2)
+    bot = FakeBot()
+
+    async def scenario():
+        for uid in (1, 5, 6):
+            await db.create_user(uid, f"user {uid}")
+        await db.add_submission(5, 0.4, "s.csv")
+        await db.add_submission(6, 0.5, "s.csv")
+        await notifier.start(bot)
+
+        # A newcomer with a smaller id ties user 6 at rank 2
+        await submit(1, 0.5)
+        await asyncio.sleep(0.2)
+        await notifier.stop(timeout=1)
+        return await db.get_user_rank(6)
+
+    assert run(scenario()) == 2
+    assert bot.sent == []
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+import utils
+import bot as bot_module
+from database import db, Aggregate
+from stats import stats, hour_key, HOURS_KEPT
+from conftest import SOLUTION, FakeBot, FakeMessage, make_job
+
+
+async def saved_aggregates():
+    async with db.SessionLocal() as session:
+        result = await session.execute(select(Aggregate))
+        return {a.key: a.value for a in result.scalars().all()}
+
+
+def test_backfill_from_existing_rows(run):
+    async def scenario():
+        await db.create_user(1, "a")
+        await db.create_user(2, "b")
+        await db.add_submission(1, 0.05, "s.csv")
+        await db.add_submission(1, 3.0, "s.csv")
+        # Pretend these rows predate the statistics feature
+        stats.load({})
+        await db.load_stats()
+        return dict(stats.values), await saved_aggregates()
+
+    values, saved = run(scenario())
+    assert values["users_total"] == 2
+    assert values["users_active"] == 1
+    assert values["submissions_total"] == 2
+    assert values["hist:0"] == 1 and values["hist:5"] == 1
+    assert values[hour_key(datetime.utcnow())] == 2
+    assert saved == values
+
+
+def test_counters_flush_and_reload(run):
+    async def scenario():
+        await db.load_stats()
+        await db.create_user(1, "a")
+        await db.add_submission(1, 0.4, "s.csv")
+        await db.add_submission(1, 0.3, "s.csv")
+        stats.record_upload("ok")
+        stats.record_upload("rejected")
+        await db.flush_stats()
+        stats.load({})
+        await db.load_stats()
+        return dict(stats.values)
+
+    values = run(scenario())
+    assert values["users_total"] == 1
+    assert values["users_active"] == 1
+    assert values["submissions_total"] == 2
+    assert values["hist:2"] == 2
+    assert stats.rate("uploads_rejected") == 0.5
+
+
+def test_old_hours_are_dropped_on_flush(run):
+    async def scenario():
+        await db.load_stats()
+        stats.record_submission(1.0, first_submission=False, at=datetime.utcnow() - timedelta(hours=HOURS_KEPT + 2))
+        await db.flush_stats()
+        stats.record_submission(1.0, first_submission=False)
+        await db.flush_stats()
+        return await saved_aggregates()
+
+    saved = run(scenario())
+    assert hour_key(datetime.utcnow()) in saved
+    assert not any(k.startswith("hour:") and k < hour_key(datetime.utcnow() - timedelta(hours=HOURS_KEPT)) for k in saved)
+
+
+def test_frozen_submission_counts_as_rejection(run, monkeypatch):
+    async def fake_score(file_bytes, solution_path=None):
+        return 0.5, None
+
+    monkeypatch.setattr(bot_module, "score_submission", fake_score)
+    job = make_job()
+    status = FakeMessage()
+
+    async def scenario():
+        await db.load_stats()
+        await db.create_user(1, "a")
+        await db.set_config("competition_frozen", "true")
+        await bot_module.process_submission(FakeBot(), job, status)
+
+    run(scenario())
+    assert status.text == bot_module.MSG_FROZEN
+    assert stats.get("uploads_rejected") == 1
+    assert stats.get("uploads_error") == 0
+
+
+def test_scoring_outcomes_are_split_into_rejections_and_errors(run, monkeypatch):
+    monkeypatch.setattr(utils, "SOLUTION_PATH", SOLUTION)
+
+    async def scenario():
+        await db.load_stats()
+        await db.create_user(1, "a")
+        bad_upload = FakeMessage()
+        await bot_module.process_submission(FakeBot(content=b"not,a\nnumber,file\n"), make_job(), bad_upload)
+
+        monkeypatch.setattr(utils, "SOLUTION_PATH", "/nonexistent/solution.csv")
+        broken_solution = FakeMessage()
+        await bot_module.process_submission(FakeBot(), make_job(), broken_solution)
+        return bad_upload.text, broken_solution.text
+
+    bad_upload, broken_solution = run(scenario())
+    assert bad_upload.startswith("❌")
+    assert broken_solution.startswith("خطای سیستمی")
+    assert stats.get("uploads_rejected") == 1
+    assert stats.get("uploads_error") == 1
+
+
+class FakeBotMessage(FakeMessage):
+    def __init__(self):
+        super().__init__(chat_id=1)
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return FakeMessage(self.chat_id, text)
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id, data):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        self.message = FakeBotMessage()
+        self.alerts = []
+
+    async def answer(self, text=None, show_alert=False):
+        if text:
+            self.alerts.append(text)
+
+
+def test_stats_panel_requires_admin(run):
+    async def press(user_id):
+        query = FakeCallbackQuery(user_id, "admin_stats")
+        await bot_module.admin_callback(SimpleNamespace(callback_query=query), None)
+        return query
+
+    async def scenario():
+        await db.load_stats()
+        await db.create_user(1, "student")
+        await db.create_user(2, "admin", is_admin=True)
+        return await press(1), await press(2)
+
+    student, admin = run(scenario())
+    assert student.alerts == [bot_module.MSG_ADMIN_ONLY]
+    assert student.message.replies == []
+    assert len(admin.message.replies) == 1
+    assert "کاربران ثبت‌نام‌شده: 2" in admin.message.replies[0]
@@ -1,4 +1,8 @@
+import os
 import io
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from sklearn.metrics import root_mean_squared_error
@@ -7,10 +11,55 @@ from typing import Tuple, Optional
 # Whitelist is now managed in database.py
 from database import db
 
+# Ground truth lives in the repo root
+SOLUTION_PATH = os.path.join(os.getcwd(), 'solution.csv')
+
+# Scoring is CPU-bound pandas/sklearn work; keep it off the event loop
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "2"))
+_scoring_executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix="scoring")
+
+# solution_path -> (mtime, DataFrame)
+_solution_cache = {}
+
+class ScoringInternalError(Exception):
+    """Scoring failed on our side (e.g. broken solution file), not because of the upload."""
+
 async def check_whitelist(full_name: str) -> bool:
     """Check if the provided name is in the whitelist (DB)."""
     return await db.is_whitelisted(full_name.strip())
 
+def load_solution(solution_path: str) -> pd.DataFrame:
+    """Read the solution CSV once and reuse it until the file changes on disk."""
+    mtime = os.path.getmtime(solution_path)
+    cached = _solution_cache.get(solution_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    solution_df = pd.read_csv(solution_path)
+    _solution_cache[solution_path] = (mtime, solution_df)
+    return solution_df
+
+async def score_submission(student_file_bytes: bytes, solution_path: Optional[str] = None) -> Tuple[Optional[float], Optional[str]]:
+    """Run `calculate_score` on the scoring worker pool."""
+    solution_path = solution_path or SOLUTION_PATH
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_scoring_executor, calculate_score, bytes(student_file_bytes), solution_path)
+
+async def warm_up_scoring(solution_path: Optional[str] = None):
+    """Load the solution and score it against itself once per worker thread."""
+    solution_path = solution_path or SOLUTION_PATH
+    # Best-effort: without a solution file the bot still starts and uploads report the error
+    try:
+        load_solution(solution_path)
+        with open(solution_path, 'rb') as f:
+            solution_bytes = f.read()
+    except Exception as e:
+        logging.error(f"Skipping scoring warm-up, could not load {solution_path}: {e}")
+        return
+    try:
+        await asyncio.gather(*(score_submission(solution_bytes, solution_path) for _ in range(SCORING_WORKERS)))
+    except ScoringInternalError as e:
+        logging.error(f"Scoring warm-up failed: {e}")
+
 def calculate_score(student_file_bytes: bytes, solution_path: str = "solution.csv") -> Tuple[Optional[float], Optional[str]]:
     """
     Calculates RMSE between student submission and solution file.
@@ -21,13 +70,18 @@ def calculate_score(student_file_bytes: bytes, solution_path: str = "solution.cs
         
     Returns:
         Tuple(score, error_message). If success, error_message is None.
+        error_message describes a problem with the submitted file.
+
+    Raises:
+        ScoringInternalError: If scoring failed for reasons outside the
+            student's control, such as an unreadable solution file.
     """
     try:
         # Load Solution
         try:
-            solution_df = pd.read_csv(solution_path)
+            solution_df = load_solution(solution_path)
         except Exception as e:
-            return None, f"Internal Error: Could not load solution file. {str(e)}"
+            raise ScoringInternalError(f"Internal Error: Could not load solution file. {str(e)}")
 
         # Load Submission
         try:
@@ -105,5 +159,7 @@ def calculate_score(student_file_bytes: bytes, solution_path: str = "solution.cs
         rmse = root_mean_squared_error(y_true, y_pred)
         return float(rmse), None
 
+    except ScoringInternalError:
+        raise
     except Exception as e:
-        return None, f"خطای ناشناخته در محاسبه خطا: {str(e)}"
+        raise ScoringInternalError(f"خطای ناشناخته در محاسبه خطا: {str(e)}")